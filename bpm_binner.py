@@ -1,4 +1,5 @@
 # bpm_binner.py
+import numpy as np
 import pandas as pd
 
 # BPM ranges for workout states
@@ -9,6 +10,13 @@ BINS = {
     "sprint": (170, 1000)
 }
 
+# Contiguous bin edges and labels derived from BINS, for vectorized binning
+BIN_LABELS = list(BINS.keys())
+BIN_EDGES = np.array([BINS[s][0] for s in BIN_LABELS] + [BINS[BIN_LABELS[-1]][1]], dtype=float)
+
+# Default generator for callers that don't thread their own RNG through
+_RNG = np.random.default_rng()
+
 def categorize_bpm(bpm: float) -> str:
     """Assign a workout state based on BPM."""
     for state, (lower, upper) in BINS.items():
@@ -16,32 +24,47 @@ def categorize_bpm(bpm: float) -> str:
             return state
     return None
 
-def bin_songs(songs_df: pd.DataFrame) -> pd.DataFrame:
-    """Add 'state' column to songs based on BPM."""
-    df = songs_df.copy()
-    df["state"] = df["bpm"].apply(categorize_bpm)
-    return df
+def bin_songs(songs_df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+    """Add 'state' column to songs based on BPM.
 
+    With inplace=True the column is written into songs_df directly;
+    otherwise the returned frame shares the existing column buffers.
+    """
+    # Keep the Categorical dtype: equality masks compare int8 codes instead of strings
+    state = pd.cut(songs_df["bpm"], bins=BIN_EDGES, labels=BIN_LABELS, right=False)
+    if inplace:
+        songs_df["state"] = state
+        return songs_df
+    return songs_df.assign(state=state)
+
+
+def build_state_index(songs_df: pd.DataFrame) -> dict:
+    """Map each state to the positional row indices of its songs."""
+    state_col = songs_df["state"].to_numpy()
+    return {state: np.flatnonzero(state_col == state) for state in BINS}
+
+
+def choose_song_from_bin(state_index: dict, used_mask: np.ndarray, state: str, rng=None):
+    """Select a random unused row index from the given state, or fallback to any unused song."""
+    rng = _RNG if rng is None else rng
 
-def choose_song_from_bin(songs_df: pd.DataFrame, state: str, used_ids: set):
-    """Select a random unused song from the given state, or fallback to any unused song."""
-    unused = songs_df[~songs_df["id"].isin(used_ids)]
-    
     # Try to find song in requested state
-    candidates = unused[unused["state"] == state]
-    if not candidates.empty:
-        return candidates.sample(1).iloc[0]
-    
+    candidates = state_index[state]
+    candidates = candidates[~used_mask[candidates]]
+    if len(candidates):
+        return int(candidates[rng.integers(len(candidates))])
+
     # Fallback to any unused song
-    if not unused.empty:
-        return unused.sample(1).iloc[0]
-    
+    unused = np.flatnonzero(~used_mask)
+    if len(unused):
+        return int(unused[rng.integers(len(unused))])
+
     return None
 
 
 def main():
     songs = pd.read_csv("songs.csv")
-    songs_binned = bin_songs(songs)
+    songs_binned = bin_songs(songs, inplace=True)  # CLI doesn't reuse the raw frame
     
     # Print summary by state
     for state in BINS.keys():
@@ -9,6 +9,7 @@ import pandas as pd
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyOAuth
 from playlist_generator import generate_playlist
+from song_loader import load_songs
 from workout_templates import WORKOUTS
 
 load_dotenv()
@@ -29,11 +30,16 @@ def spotify_auth():
     )
     return Spotify(auth_manager=auth)
 
+# Spotify caps a single add-tracks call at 100 ids
+ADD_TRACKS_CHUNK = 100
+
 def create_spotify_playlist(sp, playlist_name, description, track_ids):
     user_id = sp.current_user()["id"]
 
-    playlist = sp.user_playlist_create(user_id, playlist_name, False, False, description)   
-    sp.user_playlist_add_tracks(user_id, playlist["id"], track_ids)
+    playlist = sp.user_playlist_create(user_id, playlist_name, False, False, description)
+    # Chunked adds, in order: playlist position must follow the workout plan
+    for i in range(0, len(track_ids), ADD_TRACKS_CHUNK):
+        sp.user_playlist_add_tracks(user_id, playlist["id"], track_ids[i:i + ADD_TRACKS_CHUNK])
     return playlist["external_urls"]["spotify"]
 
 def main():
@@ -41,7 +47,7 @@ def main():
     print("=" * 50)
     
     # Load binned songs
-    df = pd.read_csv("songs_binned.csv")
+    df = load_songs()
     
     # Generate playlist
     print("\nGenerating playlist...")
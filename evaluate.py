@@ -5,17 +5,16 @@ Compare playlist generation strategies and compute Markov chain properties.
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from playlist_generator import generate_playlist, STATES, PHASE_WEIGHTS
+from playlist_generator import generate_playlist, precompute_matrices, sample_playlist, STATES, PHASE_WEIGHTS
 from bpm_binner import BINS
-from markov_model import compute_bin_centers, build_base_transition
+from markov_model import compute_bin_centers, build_base_transition, STATE_TO_IDX
+from song_loader import load_songs
 
 
 def compute_transition_variance(playlist):
     """Measure BPM smoothness (lower = smoother transitions)."""
-    bpms = [song['bpm'] for song in playlist]
-    transitions = np.diff(bpms)
-    return float(np.var(transitions))
+    bpms = np.fromiter((song['bpm'] for song in playlist), dtype=np.float64, count=len(playlist))
+    return float(np.var(np.diff(bpms)))
 
 def compute_phase_accuracy(playlist, plan):
     """Check how well songs match target phase BPMs."""
@@ -27,16 +26,14 @@ def compute_phase_accuracy(playlist, plan):
         "sprint": 180  # Use realistic upper bound instead of midpoint of (170, 1000)
     }
     
-    errors = []
-    idx = 0
-    for phase, length in plan:
-        target_bpm = phase_bpms[phase]
-        for _ in range(length):
-            if idx < len(playlist):
-                errors.append(abs(playlist[idx]['bpm'] - target_bpm))
-                idx += 1
-    
-    return float(np.mean(errors)) if errors else 0.0
+    # One target BPM per playlist slot, truncated to the playlist length
+    targets = np.repeat([phase_bpms[phase] for phase, _ in plan],
+                        [length for _, length in plan])[:len(playlist)]
+    if len(targets) == 0:
+        return 0.0
+
+    bpms = np.fromiter((song['bpm'] for song in playlist), dtype=np.float64, count=len(playlist))
+    return float(np.mean(np.abs(bpms[:len(targets)] - targets)))
 
 def compute_expected_hitting_times(P, target_state_idx):
     """
@@ -52,59 +49,86 @@ def compute_expected_hitting_times(P, target_state_idx):
     
     # Set up linear system (I - P) h = 1, excluding target state
     # solve: h(i) - sum_j P_ij h(j) = 1
-    non_target = [i for i in range(n) if i != target_state_idx]
-    
-    # Extract submatrix excluding target state
-    P_sub = P[np.ix_(non_target, non_target)]
-    I_sub = np.eye(len(non_target))
-    
-    # Solve (I - P_sub) h_sub = 1
-    A = I_sub - P_sub
-    b = np.ones(len(non_target))
-    
+    non_target = np.delete(np.arange(n), target_state_idx)
+
+    # Solve (I - P_sub) h_sub = 1 on the submatrix excluding the target
+    A = np.eye(n - 1) - P[np.ix_(non_target, non_target)]
+    b = np.ones(n - 1)
+
     try:
         h_sub = np.linalg.solve(A, b)
     except np.linalg.LinAlgError:
         # Fallback for singular matrix
         h_sub = np.linalg.lstsq(A, b, rcond=None)[0]
-    
-    # Reconstruct full hitting time vector
+
+    # Reconstruct full hitting time vector with one scatter
     h = np.zeros(n)
-    for i, state_idx in enumerate(non_target):
-        h[state_idx] = h_sub[i]
-    
+    h[non_target] = h_sub
+
     return h
 
 
-def baseline_random(df, plan):
+def compute_all_hitting_times(P):
+    """
+    Compute expected hitting times between every pair of states.
+
+    One factorization of the fundamental matrix Z = (I - P + 1·pi)^-1
+    serves all targets at once: H[i, j] = (Z[j, j] - Z[i, j]) / pi[j],
+    so sweeping over targets costs nothing beyond the single solve.
+
+    Returns: (n, n) array with H[i, j] = expected steps from i to j
+    """
+    n = P.shape[0]
+
+    # Stationary distribution: left eigenvector of P for eigenvalue 1
+    w, v = np.linalg.eig(P.T)
+    pi = np.real(v[:, np.argmin(np.abs(w - 1))])
+    pi /= pi.sum()
+
+    Z = np.linalg.inv(np.eye(n) - P + np.outer(np.ones(n), pi))
+    return (np.diag(Z)[None, :] - Z) / pi[None, :]
+
+
+def baseline_random(df, plan, rng=None):
     """Random shuffle baseline."""
     total_songs = sum(length for _, length in plan)
-    sampled = df.sample(n=min(total_songs, len(df)))
+    sampled = df.sample(n=min(total_songs, len(df)), random_state=rng)
     return sampled.to_dict('records')
 
 
 def baseline_sorted(df, plan):
     """Sort by BPM baseline (ascending)."""
     total_songs = sum(length for _, length in plan)
-    sorted_df = df.nsmallest(total_songs, 'bpm')
-    return sorted_df.to_dict('records')
+    bpm = df['bpm'].to_numpy()
+    k = min(total_songs, len(bpm))
+
+    # O(N) partition for the k smallest, then sort just those k
+    idx = np.argpartition(bpm, k - 1)[:k]
+    idx = idx[np.argsort(bpm[idx])]
+    return df.iloc[idx].to_dict('records')
 
 
-def compare_strategies(df, plan, n_trials=5):
+def compare_strategies(df, plan, n_trials=5, seed=None):
     """
     Compare Markov vs baselines over multiple trials.
     Returns mean and std of metrics.
     """
+    # One Generator shared across trials; seed it for reproducible runs
+    rng = np.random.default_rng(seed)
+
     results = {
         "Markov": {"variance": [], "phase_error": []},
         "Random": {"variance": [], "phase_error": []},
         "Sorted": {"variance": [], "phase_error": []}
     }
     
+    # Transition matrices are deterministic in (df, plan, tau); build once
+    P_seq = precompute_matrices(df, plan)
+
     for trial in range(n_trials):
         # Generate playlists
-        markov_pl = generate_playlist(df, plan)
-        random_pl = baseline_random(df, plan)
+        markov_pl = sample_playlist(df, P_seq, rng=rng)
+        random_pl = baseline_random(df, plan, rng=rng)
         sorted_pl = baseline_sorted(df, plan)
         
         # Compute metrics
@@ -135,19 +159,21 @@ def analyze_sensitivity(df, tau_values=[5.0, 10.0, 15.0, 20.0]):
     Analyze how tau affects transition smoothness and hitting times.
     """
     plan = [("warmup", 2), ("steady_state", 3), ("push_pace", 2), ("sprint", 1)]
-    
+
+    # Centers don't depend on tau; compute once for the whole sweep
+    centers = compute_bin_centers(df)
+    sprint_idx = STATE_TO_IDX["sprint"]
+
     results = []
     for tau in tau_values:
         # Generate playlist with this tau
         playlist = generate_playlist(df, plan, tau=tau)
         variance = compute_transition_variance(playlist)
-        
-        # Compute hitting time to sprint state
-        centers = compute_bin_centers(df)
+
+        # Hitting times to every target from one factorization
         P = build_base_transition(centers, tau=tau)
-        sprint_idx = STATES.index("sprint")
-        hitting_times = compute_expected_hitting_times(P, sprint_idx)
-        warmup_to_sprint = hitting_times[0]  # From warmup state
+        H = compute_all_hitting_times(P)
+        warmup_to_sprint = H[0, sprint_idx]  # From warmup state
         
         results.append({
             "tau": tau,
@@ -160,6 +186,8 @@ def analyze_sensitivity(df, tau_values=[5.0, 10.0, 15.0, 20.0]):
 
 def plot_sensitivity_analysis(sensitivity_df, output_path="sensitivity_analysis.png"):
     """Plot tau vs variance and hitting time."""
+    import matplotlib.pyplot as plt  # deferred: keep library imports of evaluate cheap
+
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
     
     # Plot variance
@@ -184,7 +212,7 @@ def plot_sensitivity_analysis(sensitivity_df, output_path="sensitivity_analysis.
 
 
 def main():
-    df = pd.read_csv("songs_binned.csv")
+    df = load_songs()
     
     # Standard workout plan
     plan = [
@@ -216,7 +244,7 @@ def main():
     
     centers = compute_bin_centers(df)
     P_base = build_base_transition(centers, tau=12.0)
-    sprint_idx = STATES.index("sprint")
+    sprint_idx = STATE_TO_IDX["sprint"]
     hitting_times = compute_expected_hitting_times(P_base, sprint_idx)
     
     print("\nExpected number of steps to reach Sprint from:")
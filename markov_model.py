@@ -8,10 +8,17 @@ import os
 import json
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from song_loader import load_songs
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # Workout states in order
 STATES = ["warmup", "steady_state", "push_pace", "sprint"]
+STATE_TO_IDX = {state: i for i, state in enumerate(STATES)}
 
 # Phase-specific transition weights
 PHASE_WEIGHTS = {
@@ -21,10 +28,16 @@ PHASE_WEIGHTS = {
     "sprint":       [0.6, 0.9, 1.5, 10.0],
 }
 
+# Phase weights stacked in STATES order for batched matrix builds
+PHASE_WEIGHTS_ARR = np.array([PHASE_WEIGHTS[s] for s in STATES], dtype=np.float64)
+
+# Default generator for callers that don't thread their own RNG through
+_RNG = np.random.default_rng()
+
 def compute_bin_centers(df: pd.DataFrame) -> np.ndarray:
     """Compute mean BPM for each state."""
-    centers = [df[df["state"] == state]["bpm"].mean() for state in STATES]
-    return np.array(centers, dtype=float)
+    means = df.groupby("state", observed=True)["bpm"].mean()
+    return means.reindex(STATES).to_numpy(dtype=float)
 
 
 def build_similarity_matrix(centers: np.ndarray, tau: float = 12.0) -> np.ndarray:
@@ -42,9 +55,13 @@ def row_normalize(mat: np.ndarray) -> np.ndarray:
 
 
 def build_base_transition(centers: np.ndarray, tau: float = 12.0) -> np.ndarray:
-    """Build base transition matrix from BPM centers."""
-    S = build_similarity_matrix(centers, tau)
-    return row_normalize(S)
+    """Build base transition matrix from BPM centers (softmax over -|d|/tau)."""
+    # Fused similarity + row-normalize: one buffer, in-place exp and divide
+    d = -np.abs(centers[:, None] - centers[None, :]) / tau
+    d -= d.max(axis=1, keepdims=True)  # numerical stability
+    np.exp(d, out=d)
+    d /= d.sum(axis=1, keepdims=True)
+    return d
 
 
 def build_phase_matrix(P_base: np.ndarray, weights: list) -> np.ndarray:
@@ -53,21 +70,51 @@ def build_phase_matrix(P_base: np.ndarray, weights: list) -> np.ndarray:
     return row_normalize(weighted)
 
 
-def simulate_chain(P_seq: list, x0: int = 0) -> list:
+def build_all_phase_matrices(P_base: np.ndarray) -> dict:
+    """Build every phase matrix in one broadcast over the stacked weights."""
+    W = P_base[None, :, :] * PHASE_WEIGHTS_ARR[:, None, :]
+    W /= W.sum(axis=-1, keepdims=True)
+    return {state: W[i] for i, state in enumerate(STATES)}
+
+
+def _simulate_core(P_cum: np.ndarray, x0: int, us: np.ndarray) -> np.ndarray:
+    """Walk the chain over stacked cumulative rows; jitted when numba is available."""
+    T = P_cum.shape[0]
+    path = np.empty(T + 1, np.int64)
+    path[0] = x0
+    s = x0
+    for t in range(T):
+        row = P_cum[t, s]
+        i = 0
+        while i < row.shape[0] - 1 and us[t] > row[i]:
+            i += 1
+        path[t + 1] = i
+        s = i
+    return path
+
+
+if njit is not None:
+    _simulate_core = njit(cache=True)(_simulate_core)
+
+
+def simulate_chain(P_seq: list, x0: int = 0, rng=None) -> list:
     """
     Simulate Markov chain.
     P_seq: list of transition matrices
     x0: starting state index
+    rng: optional numpy Generator (defaults to a module-level one)
     Returns: list of visited states
     """
-    state = x0
-    path = [state]
-    
-    for P in P_seq:
-        state = np.random.choice(len(P), p=P[state])
-        path.append(state)
-    
-    return path
+    if not P_seq:
+        return [x0]
+
+    rng = _RNG if rng is None else rng
+
+    # Stack into one 3D cumulative array and draw all uniforms up front
+    P_cum = np.cumsum(np.stack(P_seq), axis=-1)
+    us = rng.random(len(P_seq))
+
+    return _simulate_core(P_cum, x0, us).tolist()
 
 
 def save_matrix_json(mat: np.ndarray, path: str):
@@ -83,6 +130,8 @@ def save_matrix_json(mat: np.ndarray, path: str):
 
 def plot_heatmap(mat: np.ndarray, path: str, title: str):
     """Plot and save transition matrix heatmap."""
+    import matplotlib.pyplot as plt  # deferred: keep library imports of this module cheap
+
     plt.figure(figsize=(6, 5))
     plt.imshow(mat, cmap="viridis", aspect="auto", interpolation="nearest")
     plt.colorbar(fraction=0.046, pad=0.04)
@@ -98,7 +147,7 @@ def plot_heatmap(mat: np.ndarray, path: str, title: str):
 
 def main():
     # Load binned songs
-    df = pd.read_csv("songs_binned.csv")
+    df = load_songs()
     
     # Compute BPM centers for each state
     centers = compute_bin_centers(df)
@@ -117,8 +166,7 @@ def main():
     plot_heatmap(P_base, "matrices/P_base.png", "Base Transition Matrix")
     
     # Build and save phase-specific matrices
-    for phase, weights in PHASE_WEIGHTS.items():
-        P_phase = build_phase_matrix(P_base, weights)
+    for phase, P_phase in build_all_phase_matrices(P_base).items():
         print(f"\nP_{phase}:")
         print(pd.DataFrame(np.round(P_phase, 3), index=STATES, columns=STATES))
         
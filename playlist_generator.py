@@ -5,45 +5,63 @@ Generate workout playlists using Markov chain state transitions.
 
 import numpy as np
 import pandas as pd
-from markov_model import compute_bin_centers, build_base_transition, build_phase_matrix, simulate_chain, PHASE_WEIGHTS, STATES
-from bpm_binner import choose_song_from_bin
+from markov_model import compute_bin_centers, build_base_transition, build_all_phase_matrices, simulate_chain, PHASE_WEIGHTS, STATES
+from bpm_binner import build_state_index, choose_song_from_bin
+from song_loader import load_songs
 
-def generate_playlist(df: pd.DataFrame, plan: list, tau: float = 12.0) -> list:
+def precompute_matrices(df: pd.DataFrame, plan: list, tau: float = 12.0) -> list:
+    """
+    Build the per-slot transition matrix sequence for a workout plan.
+
+    Deterministic in (df, plan, tau), so the result can be reused across
+    repeated playlist draws (e.g. evaluation trials).
+    """
+    centers = compute_bin_centers(df)
+    P_base = build_base_transition(centers, tau=tau)
+
+    # One broadcast builds every phase matrix; plan slots index into the dict
+    phase_matrices = build_all_phase_matrices(P_base)
+    return [phase_matrices[phase] for phase, length in plan for _ in range(length)]
+
+
+def sample_playlist(df: pd.DataFrame, P_seq: list, rng=None) -> list:
+    """Simulate a state path over P_seq and pick one song per step."""
+    state_path = simulate_chain(P_seq, x0=0, rng=rng)
+    state_index = build_state_index(df)
+    used_mask = np.zeros(len(df), dtype=bool)
+    cols = {c: df[c].to_numpy() for c in df.columns}
+    playlist = []
+
+    for state_idx in state_path[1:]:  # Skip initial state
+        state = STATES[state_idx]
+        i = choose_song_from_bin(state_index, used_mask, state, rng=rng)
+
+        if i is not None:
+            used_mask[i] = True
+            track = {}
+            for c, arr in cols.items():
+                v = arr[i]
+                track[c] = v.item() if isinstance(v, np.generic) else v
+            playlist.append(track)
+
+    return playlist
+
+
+def generate_playlist(df: pd.DataFrame, plan: list, tau: float = 12.0, rng=None) -> list:
     """
     Generate playlist following a workout plan.
-    
+
     Args:
         df: DataFrame with binned songs
         plan: List of (phase_name, num_songs) tuples
         tau: Temperature parameter for transition matrix
-    
+        rng: Optional numpy Generator for reproducible draws
+
     Returns:
         List of song dictionaries
     """
-    # Build transition matrices
-    centers = compute_bin_centers(df)
-    P_base = build_base_transition(centers, tau=tau)
-    
-    # Create sequence of phase-specific matrices
-    P_seq = []
-    for phase, length in plan:
-        P_phase = build_phase_matrix(P_base, PHASE_WEIGHTS[phase])
-        P_seq.extend([P_phase] * length)
-    
-    # Simulate state path and select songs
-    state_path = simulate_chain(P_seq, x0=0)
-    used_ids = set()
-    playlist = []
-    
-    for state_idx in state_path[1:]:  # Skip initial state
-        state = STATES[state_idx]
-        song = choose_song_from_bin(df, state, used_ids)
-        
-        if song is not None:
-            used_ids.add(song["id"])
-            playlist.append(song.to_dict())
-    
-    return playlist
+    P_seq = precompute_matrices(df, plan, tau=tau)
+    return sample_playlist(df, P_seq, rng=rng)
 
 def parse_duration(duration_str):
     """Convert MM:SS string to total seconds."""
@@ -62,7 +80,7 @@ def format_duration(total_seconds):
 
 
 def main():
-    df = pd.read_csv("songs_binned.csv")
+    df = load_songs()
     
     # Workout plan: (phase, number_of_songs)
     plan = [
@@ -75,8 +93,8 @@ def main():
     
     playlist = generate_playlist(df, plan, tau=12.0)
     
-    # Calculate total duration
-    total_seconds = sum(parse_duration(track['duration']) for track in playlist)
+    # Calculate total duration from the precomputed per-song seconds
+    total_seconds = sum(track['duration_s'] for track in playlist)
     total_duration_str = format_duration(total_seconds)
     
     print("Generated Playlist:")
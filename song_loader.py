@@ -0,0 +1,31 @@
+# song_loader.py
+"""
+Shared loader for songs_binned.csv.
+Reads only the columns the pipeline uses, with explicit dtypes.
+"""
+
+import pandas as pd
+
+USECOLS = ["id", "name", "artists", "duration", "bpm", "state"]
+
+DTYPES = {
+    "id": "string",
+    "name": "string",
+    "artists": "category",
+    "duration": "string",
+    "bpm": "float32",
+    "state": "category",
+}
+
+
+def load_songs(path: str = "songs_binned.csv") -> pd.DataFrame:
+    """Load binned songs with trimmed columns and explicit dtypes."""
+    df = pd.read_csv(path, usecols=USECOLS, dtype=DTYPES)
+
+    # Vectorized MM:SS -> seconds; malformed durations become 0
+    parts = df["duration"].str.split(":", n=1, expand=True)
+    minutes = pd.to_numeric(parts[0], errors="coerce")
+    seconds = pd.to_numeric(parts[1] if 1 in parts.columns else None, errors="coerce")
+    df["duration_s"] = (minutes * 60 + seconds).fillna(0).astype("int32")
+
+    return df
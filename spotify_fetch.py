@@ -4,15 +4,24 @@ Fetch user's Liked Songs and audio features from Spotify.
 Saves songs.csv with columns: id,name,artists,duration,bpm,energy,danceability
 Requires environment variables:
   SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI, RAPIDAPI_KEY
-Install: pip install spotipy pandas python-dotenv requests
+Install: pip install spotipy pandas python-dotenv httpx[http2] tenacity
 """
+import asyncio
+import json
 import os
+import sqlite3
 import time
 from typing import List, Dict
 
+import httpx
 import pandas as pd
-import requests
 from dotenv import load_dotenv
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyOAuth
 
@@ -21,6 +30,39 @@ load_dotenv()
 SCOPE = "user-library-read"
 CACHE_PATH = ".cache"
 
+RAPIDAPI_HOST = "track-analysis.p.rapidapi.com"
+FEATURES_URL = "https://track-analysis.p.rapidapi.com/pktx/spotify/{track_id}"
+
+# Concurrent RapidAPI requests in flight at once
+MAX_CONCURRENT_REQUESTS = 10
+
+# RapidAPI quota, requests per second; override via env on tier upgrades
+RAPIDAPI_QPS = float(os.getenv("RAPIDAPI_QPS", "5"))
+
+
+class _TokenBucket:
+    """Minimal asyncio rate limiter: at most `rate` acquisitions per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+# On-disk cache of RapidAPI responses; features are stable per track id
+FEATURES_CACHE_PATH = ".features_cache.sqlite"
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# The only SoundNet payload fields the pipeline consumes
+FEATURE_FIELDS = ("duration", "tempo", "energy", "danceability")
+
 
 def spotify_auth(scope: str = SCOPE) -> Spotify:
     """Authenticate with Spotify using environment variables."""
@@ -35,9 +77,15 @@ def spotify_auth(scope: str = SCOPE) -> Spotify:
 
 
 def get_liked_tracks_items(sp: Spotify, max_tracks: int = 50) -> List[Dict]:
-    """Fetch liked tracks items from Spotify API."""
-    results = sp.current_user_saved_tracks(limit=max_tracks, offset=0)
-    return results["items"]
+    """Fetch liked tracks items from Spotify API, paging past the 50-per-call limit."""
+    items = []
+    while len(items) < max_tracks:
+        limit = min(50, max_tracks - len(items))
+        results = sp.current_user_saved_tracks(limit=limit, offset=len(items))
+        items.extend(results["items"])
+        if len(results["items"]) < limit:
+            break
+    return items
 
 
 def format_track_string(track: Dict) -> str:
@@ -45,73 +93,167 @@ def format_track_string(track: Dict) -> str:
     return f"{track['name']} by {track['artists'][0]['name']}"
 
 
-def fetch_liked_tracks(sp: Spotify, max_tracks: int = 50) -> List[str]:
-    """Fetch saved tracks (liked songs) as formatted strings."""
-    items = get_liked_tracks_items(sp, max_tracks)
-    return [format_track_string(item["track"]) for item in items]
+def fetch_liked_tracks(sp: Spotify, max_tracks: int = 50) -> List[Dict]:
+    """Fetch saved tracks (liked songs) once, for both printing and feature fetch."""
+    return [item["track"] for item in get_liked_tracks_items(sp, max_tracks)]
+
+
+def _open_feature_cache(path: str = FEATURES_CACHE_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the on-disk feature cache."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS features (id TEXT PRIMARY KEY, json TEXT, fetched_at INTEGER)"
+    )
+    return conn
+
+
+def _cached_features(conn: sqlite3.Connection, track_ids: List[str]) -> Dict[str, Dict]:
+    """Return {id: features} for cached ids that haven't passed the TTL."""
+    if not track_ids:
+        return {}
+    cutoff = int(time.time()) - CACHE_TTL_SECONDS
+    placeholders = ",".join("?" * len(track_ids))
+    rows = conn.execute(
+        f"SELECT id, json FROM features WHERE fetched_at >= ? AND id IN ({placeholders})",
+        [cutoff, *track_ids]
+    ).fetchall()
+    return {track_id: json.loads(blob) for track_id, blob in rows}
+
+
+def _store_features(conn: sqlite3.Connection, features_by_id: Dict[str, Dict]):
+    """Insert or refresh fetched features in the cache."""
+    now = int(time.time())
+    conn.executemany(
+        "INSERT OR REPLACE INTO features VALUES (?, ?, ?)",
+        [(track_id, json.dumps(features), now) for track_id, features in features_by_id.items()]
+    )
+    conn.commit()
+
+
+def _retry_wait(retry_state):
+    """Honor a 429's Retry-After header; otherwise back off exponentially."""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+        retry_after = exc.response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return wait_exponential_jitter(initial=1, max=10)(retry_state)
 
 
-def get_audio_features_soundnet(track_id: str, rapid_api_key: str) -> Dict:
-    """Fetch audio features from SoundNet API using Spotify track ID."""
-    url = f"https://track-analysis.p.rapidapi.com/pktx/spotify/{track_id}"
+@retry(stop=stop_after_attempt(4), wait=_retry_wait,
+       retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TransportError)),
+       reraise=True)
+async def get_audio_features_soundnet(client: httpx.AsyncClient, track_id: str) -> Dict:
+    """Fetch audio features from SoundNet API using Spotify track ID.
+
+    Only the fields the pipeline uses are kept, so the cache stores four
+    scalars per track rather than the full payload.
+    """
+    response = await client.get(FEATURES_URL.format(track_id=track_id))
+    response.raise_for_status()
+    data = orjson.loads(response.content) if orjson is not None else response.json()
+    return {field: data.get(field) for field in FEATURE_FIELDS}
+
+
+async def _fetch_all_features(track_ids: List[str], rapid_api_key: str,
+                              on_result=None) -> List:
+    """Fetch features for many tracks concurrently, bounded by a semaphore.
+
+    A shared token bucket paces requests to the API quota, so throughput
+    tracks the actual rate limit instead of a fixed per-request sleep.
+    on_result(track_id, features) is invoked as each fetch completes, so
+    callers can persist progress before the whole batch finishes.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    bucket = _TokenBucket(RAPIDAPI_QPS)
+
+    async def fetch_one(client, track_id):
+        async with sem:
+            await bucket.acquire()
+            features = await get_audio_features_soundnet(client, track_id)
+        if on_result is not None:
+            on_result(track_id, features)
+        return features
+
     headers = {
         "x-rapidapi-key": rapid_api_key,
-        "x-rapidapi-host": "track-analysis.p.rapidapi.com"
+        "x-rapidapi-host": RAPIDAPI_HOST
     }
-    
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
+    # HTTP/2 multiplexes the whole fan-out over one TLS connection
+    async with httpx.AsyncClient(http2=True, headers=headers) as client:
+        return await asyncio.gather(*[fetch_one(client, tid) for tid in track_ids],
+                                    return_exceptions=True)
 
-def fetch_audio_features(sp: Spotify, rapid_api_key: str, max_tracks: int = 50) -> pd.DataFrame:
-    """Fetch audio features for all liked tracks and return as DataFrame."""
-    items = get_liked_tracks_items(sp, max_tracks)
-    rows = []
 
-    for item in items:
-        track = item["track"]
-        track_id = track["id"]
-        
-        if not track_id:
+def fetch_audio_features(liked_tracks: List[Dict], rapid_api_key: str) -> pd.DataFrame:
+    """Fetch audio features for the given liked tracks and return as DataFrame."""
+    tracks = []
+    seen = set()
+    for track in liked_tracks:
+        if not track["id"]:
             print(f"Skipping track with missing id: {track['name']}")
             continue
+        if track["id"] in seen:
+            continue
+        seen.add(track["id"])
+        tracks.append(track)
 
-        try:
-            features = get_audio_features_soundnet(track_id, rapid_api_key)
-            
-            rows.append({
-                "id": track_id,
-                "name": track["name"],
-                "artists": track["artists"][0]["name"],
-                "duration": features.get("duration"),
-                "bpm": features.get("tempo"),
-                "energy": features.get("energy"),
-                "danceability": features.get("danceability")
-            })
-            
-            time.sleep(1.1)  # Rate limiting
-    
-        except Exception as e:
-            print(f"Error fetching features for {track['name']}: {e}")
+    # Serve from the on-disk cache and only hit RapidAPI for unseen ids
+    conn = _open_feature_cache()
+    features_by_id = _cached_features(conn, [track["id"] for track in tracks])
+    missing = [track["id"] for track in tracks if track["id"] not in features_by_id]
+
+    if missing:
+        # Persist every completed response immediately: a crash mid-batch
+        # keeps what was already fetched instead of re-burning quota
+        fetched = asyncio.run(_fetch_all_features(
+            missing, rapid_api_key,
+            on_result=lambda tid, features: _store_features(conn, {tid: features})
+        ))
+        features_by_id.update(zip(missing, fetched))
+    conn.close()
+
+    # Column-wise construction: one DataFrame call, no per-row dicts
+    columns = {c: [] for c in ("id", "name", "artists", "duration",
+                               "bpm", "energy", "danceability")}
+    for track in tracks:
+        features = features_by_id[track["id"]]
+        if isinstance(features, Exception):
+            print(f"Error fetching features for {track['name']}: {features}")
             continue
-        
-    return pd.DataFrame(rows)
+
+        columns["id"].append(track["id"])
+        columns["name"].append(track["name"])
+        columns["artists"].append(track["artists"][0]["name"])
+        columns["duration"].append(features.get("duration"))
+        columns["bpm"].append(features.get("tempo"))
+        columns["energy"].append(features.get("energy"))
+        columns["danceability"].append(features.get("danceability"))
+
+    return pd.DataFrame(columns)
 
 
 def main():
     print("Authenticating with Spotify…")
     sp = spotify_auth()
     
-    # Fetch and display liked songs
-    liked_songs = fetch_liked_tracks(sp, max_tracks=50)
+    # Fetch liked songs once; reused below for the feature fetch
+    liked_tracks = fetch_liked_tracks(sp, max_tracks=50)
     print("\nYour 50 most recent liked songs:\n")
-    for idx, song in enumerate(liked_songs, start=1):
-        print(f"{idx:2d}. {song}")
-    
+    for idx, track in enumerate(liked_tracks, start=1):
+        print(f"{idx:2d}. {format_track_string(track)}")
+
     # Fetch audio features and save to CSV
     rapid_api_key = os.getenv("RAPIDAPI_KEY")
-    df = fetch_audio_features(sp, rapid_api_key, max_tracks=50)
+    df = fetch_audio_features(liked_tracks, rapid_api_key)
+
+    # Downcast numerics so the CSV stays compact and re-parses quickly;
+    # duration stays the MM:SS string the downstream scripts consume
+    for col in ("bpm", "energy", "danceability"):
+        df[col] = pd.to_numeric(df[col], errors="coerce", downcast="float")
 
     df.to_csv("songs.csv", index=False)
     print("\nSaved to songs.csv")
@@ -3,46 +3,104 @@
 Visualize BPM distribution of songs.
 """
 
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless rendering; never start a GUI backend
 import matplotlib.pyplot as plt
 from playlist_generator import generate_playlist
+from song_loader import load_songs
+from workout_templates import plan_offsets
+
+try:
+    from fast_histogram import histogram1d
+except ImportError:
+    histogram1d = None
+
+# One Figure reused across plots; clearing beats reallocating the canvas
+_FIG = None
+
+
+def _get_axes(figsize):
+    """Return cleared axes on the shared figure, resized as requested."""
+    global _FIG
+    if _FIG is None:
+        _FIG = plt.figure(figsize=figsize)
+    else:
+        _FIG.clear()
+        _FIG.set_size_inches(*figsize)
+    return _FIG.add_subplot(111)
+
+
+def _histogram_counts(values: np.ndarray, bins: int = 10):
+    """Histogram counts and edges; uses fast-histogram's uniform-bin path if installed."""
+    if histogram1d is not None:
+        lo, hi = float(values.min()), float(values.max())
+        counts = histogram1d(values, bins=bins, range=(lo, hi))
+        return counts, np.linspace(lo, hi, bins + 1)
+
+    # BPMs are small integers, so bincount beats np.histogram's edge search:
+    # count each integer BPM, then fold runs of `width` integers into each bin
+    bpm_int = values.astype(np.int32)
+    lo = int(bpm_int.min())
+    span = int(bpm_int.max()) - lo + 1
+    width = -(-span // bins)  # ceil division so every value lands in a bin
+    counts = np.bincount(bpm_int - lo, minlength=width * bins)
+    binned = counts.reshape(bins, width).sum(axis=1)
+    edges = lo + width * np.arange(bins + 1)
+    return binned, edges
+
 
 def plot_bpm_histogram(df: pd.DataFrame, output_path: str = "bpm_histogram.png"):
     """Plot and save histogram of song BPMs."""
-    bpm = df["bpm"].dropna()
-    
-    plt.figure(figsize=(8, 5))
-    plt.hist(bpm, bins=10, edgecolor="black", alpha=0.75)
-    plt.xlabel("BPM", fontsize=12)
-    plt.ylabel("Count", fontsize=12)
-    plt.title("Distribution of Song BPMs", fontsize=14)
-    plt.grid(axis="y", linestyle="--", alpha=0.4)
-    plt.tight_layout()
-    
-    plt.savefig(output_path, dpi=300, bbox_inches="tight")
-    plt.close()
+    # One contiguous float32 buffer shared by the binning and the plot
+    bpm = np.ascontiguousarray(df["bpm"].dropna().to_numpy(), dtype=np.float32)
+
+    # Precompute the histogram and draw one bar artist, skipping plt.hist's pipeline
+    counts, edges = _histogram_counts(bpm, bins=10)
+
+    ax = _get_axes((8, 5))
+    fig = ax.figure
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge",
+           edgecolor="black", alpha=0.75)
+    ax.set_xlabel("BPM", fontsize=12)
+    ax.set_ylabel("Count", fontsize=12)
+    ax.set_title("Distribution of Song BPMs", fontsize=14)
+    ax.grid(axis="y", linestyle="--", alpha=0.4)
+    fig.tight_layout()
+
+    fig.savefig(output_path, dpi=300, bbox_inches="tight")
     print(f"Saved {output_path}")
 
 
 def plot_playlist_timeline(playlist, plan, output_path="playlist_timeline.png"):
     """Plot BPM over time with workout phases highlighted."""
     import matplotlib.patches as mpatches
-    
+    from collections import defaultdict
+
     bpms = [song['bpm'] for song in playlist]
-    
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
+
+    ax = _get_axes((12, 6))
+    fig = ax.figure
+
     # Plot BPM line
     ax.plot(range(len(bpms)), bpms, 'o-', linewidth=2, markersize=8, color='#2E86AB')
-    
+
     # Shade background by phase
-    colors = {"warmup": "#A23B72", "steady_state": "#F18F01", 
+    colors = {"warmup": "#A23B72", "steady_state": "#F18F01",
               "push_pace": "#C73E1D", "sprint": "#6A0572"}
-    
-    idx = 0
-    for phase, length in plan:
-        ax.axvspan(idx, idx + length, alpha=0.2, color=colors.get(phase, 'gray'))
-        idx += length
+
+    # Group spans by phase so each color becomes one broken_barh artist
+    cum = plan_offsets(plan)
+    spans = defaultdict(list)
+    for i, (phase, length) in enumerate(plan):
+        spans[phase].append((cum[i], length))
+
+    ymin, ymax = 0, 1
+    for phase, phase_spans in spans.items():
+        ax.broken_barh(phase_spans, (ymin, ymax - ymin),
+                       facecolors=colors.get(phase, 'gray'), alpha=0.2,
+                       transform=ax.get_xaxis_transform())
     
     ax.set_xlabel("Song Number", fontsize=12)
     ax.set_ylabel("BPM", fontsize=12)
@@ -54,15 +112,15 @@ def plot_playlist_timeline(playlist, plan, output_path="playlist_timeline.png"):
                for p, _ in plan]
     ax.legend(handles=patches, loc='upper left')
     
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"Saved {output_path}")
 
 
 def main():
-    df_binned = pd.read_csv("songs_binned.csv")
-    df = pd.read_csv("songs.csv")
+    df_binned = load_songs()
+    # The histogram only needs bpm; skip parsing every other column
+    df = pd.read_csv("songs.csv", usecols=["bpm"], dtype={"bpm": "float32"})
 
     plan = [
         ("warmup", 2),
@@ -1,6 +1,8 @@
 # workout_templates.py
 """Common interval workout patterns."""
 
+from itertools import accumulate
+
 WORKOUTS = {
     "beginner_30min": [
         ("warmup", 3),
@@ -35,4 +37,20 @@ WORKOUTS = {
         ("steady_state", 2),
         ("sprint", 1)
     ]
+}
+
+
+def plan_offsets(plan):
+    """Cumulative start index of each plan entry; last value is the total length."""
+    return list(accumulate((length for _, length in plan), initial=0))
+
+
+# Precomputed per-workout metadata so consumers don't re-scan the tuples
+WORKOUTS_META = {
+    name: {
+        "plan": plan,
+        "cum": plan_offsets(plan),
+        "total": sum(length for _, length in plan),
+    }
+    for name, plan in WORKOUTS.items()
 }
\ No newline at end of file